@@ -7,6 +7,13 @@ class Unmodifiable_Data():  # Reads the input parameters: checks their presence
         self.__set_delta_z('simulation params', 'delta_z', float)
         self.__set_acceptance_rate('simulation params', 'acceptance_rate', float)
         self.__set_lag_time('simulation params', 'lag_time', float)
+        self.__set_box_length('simulation params', 'box_length', float)     # Before milestones and ranges, which are checked against it
+        self.__set_milestones('simulation params', 'milestones')
+        self.__set_fit_method('simulation params', 'fit_method')
+        self.__set_delta_t('simulation params', 'delta_t', float)
+        self.__set_temperature('simulation params', 'temperature', float)
+        self.__set_z_start_range('simulation params', 'z_start_range')
+        self.__set_z_end_range('simulation params', 'z_end_range')
         self.__set_n_bins('plotting params', 'n_bins', int)
         self.__set_nbins_t('plotting params', 'nbins_t', int)
         self.__set_save_figures('plotting params', 'save_figures', bool)
@@ -67,6 +74,90 @@ class Unmodifiable_Data():  # Reads the input parameters: checks their presence
         return self.__lag_time
     lag_time = property(__get_lag_time)
 
+    def __set_milestones(self, section, parameter_name):     # Optional: if missing or empty, only z_start -> z_end is analysed
+        self.__milestones = None
+        if section not in self.cfg.sections() or not self.cfg.get(section, parameter_name, fallback = '').strip():
+            return
+        x = self.cfg.get(section, parameter_name).strip()
+        if x.lower() == 'auto':
+            self.__milestones = 'auto'
+            return
+        try:
+            self.__milestones = tuple(float(z) for z in x.split(','))
+        except ValueError:
+            raise OptionError(parameter_name, msg = f"Error: {parameter_name} must be 'auto' or a comma separated list of z values")
+        if not all(0 <= z < self.box_length for z in self.__milestones):
+            raise OptionError(parameter_name, msg = f'Error: {parameter_name} must be between 0 and box_length')
+        if len(self.__milestones) < 2:
+            raise OptionError(parameter_name, msg = f'Error: at least two {parameter_name} are needed')
+    def __get_milestones(self):
+        return self.__milestones
+    milestones = property(__get_milestones)
+
+    def __set_fit_method(self, section, parameter_name):     # Optional: default is 'mle'
+        self.__fit_method = self.cfg.get(section, parameter_name, fallback = '').strip().lower() or 'mle'
+        if self.__fit_method not in {'mle', 'censored_mle', 'histogram'}:
+            raise OptionError(parameter_name, msg = f"Error: {parameter_name} must be 'mle', 'censored_mle' or 'histogram'")
+    def __get_fit_method(self):
+        return self.__fit_method
+    fit_method = property(__get_fit_method)
+
+    # Optional parameters below: if missing, the values used before they were configurable are kept
+    def get_optional(self, section, parameter_name, type, default):
+        if not self.cfg.get(section, parameter_name, fallback = '').strip():
+            return default
+        self.check_type(section, parameter_name, type)
+        return type(self.cfg.get(section, parameter_name))
+
+    def get_optional_range(self, section, parameter_name, default):     # Two comma separated floats: lower and upper limit
+        if not self.cfg.get(section, parameter_name, fallback = '').strip():
+            if default[1] > self.box_length:
+                raise OptionError(parameter_name, msg = f'Error: the default {parameter_name} ({default[0]:g}, {default[1]:g}) does not fit in box_length = {self.box_length:g}. Give {parameter_name} explicitly.')
+            return default
+        try:
+            z_range = tuple(float(z) for z in self.cfg.get(section, parameter_name).split(','))
+        except ValueError:
+            raise OptionError(parameter_name, msg = f'Error: {parameter_name} must be two comma separated values, e.g. 70, 80')
+        if len(z_range) != 2 or not (0 <= z_range[0] < z_range[1] <= self.box_length):
+            raise OptionError(parameter_name, msg = f'Error: {parameter_name} must be two increasing values between 0 and box_length')
+        return z_range
+
+    def __set_delta_t(self, section, parameter_name, type):     # Time between two frames (ps)
+        self.__delta_t = self.get_optional(section, parameter_name, type, 0.04)
+        if self.__delta_t <= 0:
+            raise OptionError(parameter_name, f'Error: {parameter_name} must be positive.')
+    def __get_delta_t(self):
+        return self.__delta_t
+    delta_t = property(__get_delta_t)
+
+    def __set_temperature(self, section, parameter_name, type):   # K
+        self.__temperature = self.get_optional(section, parameter_name, type, 300.)
+        if self.__temperature <= 0:
+            raise OptionError(parameter_name, f'Error: {parameter_name} must be positive.')
+    def __get_temperature(self):
+        return self.__temperature
+    temperature = property(__get_temperature)
+
+    def __set_box_length(self, section, parameter_name, type):    # Height of the periodic box along z (A)
+        self.__box_length = self.get_optional(section, parameter_name, type, 90.)
+        if self.__box_length <= 0:
+            raise OptionError(parameter_name, f'Error: {parameter_name} must be positive.')
+    def __get_box_length(self):
+        return self.__box_length
+    box_length = property(__get_box_length)
+
+    def __set_z_start_range(self, section, parameter_name):
+        self.__z_start_range = self.get_optional_range(section, parameter_name, (70., 80.))
+    def __get_z_start_range(self):
+        return self.__z_start_range
+    z_start_range = property(__get_z_start_range)
+
+    def __set_z_end_range(self, section, parameter_name):
+        self.__z_end_range = self.get_optional_range(section, parameter_name, (40., 70.))
+    def __get_z_end_range(self):
+        return self.__z_end_range
+    z_end_range = property(__get_z_end_range)
+
     def __set_n_bins(self, section, parameter_name, type):
         self.check_presence(section, parameter_name)
         self.check_type(section, parameter_name, type)
@@ -0,0 +1,55 @@
+from typing import Optional, Sequence
+import numpy as np
+
+
+# Exponential distribution of transition times p(t) = exp(-t/tau)/tau.
+# Maximum likelihood: tau = sum(t)/n, with analytic std. dev. tau/sqrt(n) (from the Fisher information n/tau^2).
+def exponential_mle(transition_times : Sequence[float]) -> tuple:
+    n = len(transition_times)
+    tau = np.sum(transition_times)/n
+    return tau, tau/np.sqrt(n)
+
+
+# Censoring-aware maximum likelihood: censored_time is the time spent in the starting box by the last passage, which has not
+# been completed when the trajectory ends. It adds to the total time but not to the number of events.
+def censored_exponential_mle(transition_times : Sequence[float], censored_time : float) -> tuple:
+    n = len(transition_times)
+    tau = (np.sum(transition_times) + censored_time)/n
+    return tau, tau/np.sqrt(n)
+
+
+# Maximum likelihood for many sets of transition times (files, sweep points, couples of milestones) at once.
+# Returns arrays of tau and of its std. dev.; they are nan for sets without transitions.
+def exponential_mle_batch(transition_times_sets : Sequence[Sequence[float]], censored_times : Optional[Sequence[float]] = None) -> tuple:
+    n = np.array([len(transition_times) for transition_times in transition_times_sets])
+    all_times = np.concatenate([np.asarray(transition_times, dtype = float) for transition_times in transition_times_sets] + [[0.]])
+    starts = np.concatenate(([0], np.cumsum(n)[:-1]))
+    total = np.where(n > 0, np.add.reduceat(all_times, starts), 0.) if len(n) else np.zeros(0)
+    if censored_times is not None:
+        total = total + np.asarray(censored_times, dtype = float)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        tau = np.where(n > 0, total/n, np.nan)
+        return tau, tau/np.sqrt(n)
+
+
+# Expected number of transition events in each bin for an exponential distribution: used to draw the fit on the histogram
+def exponential_curve(t_bins : Sequence[float], tau : float, n_transitions : int) -> np.ndarray:
+    t_bins = np.asarray(t_bins)
+    return n_transitions * (t_bins[1]-t_bins[0])/tau * np.exp(-t_bins/tau)
+
+
+# Previous method, kept for comparison: least squares fit of A*exp(-t/tau) on the histogram of transition times.
+# Depends on the binning and requires SciPy.
+def histogram_fit(transition_times : Sequence[float], nbins_t : int) -> tuple:
+    from scipy.optimize import curve_fit
+
+    def fitfunction(t, tau, A):    # tau is in ps only if t is
+        return A * np.exp(-t / tau)
+
+    t_bins = np.linspace(0.1, np.amax(transition_times), nbins_t)
+    hist, _ = np.histogram(transition_times, bins=t_bins)
+    t_bin_len = t_bins[1]-t_bins[0]
+    best_vals, covar = curve_fit(fitfunction, t_bins[:-1] + t_bin_len, hist, p0=[500.0, hist[0]] )
+    f_bins = fitfunction(t_bins, *best_vals)    # y values of fit curve
+
+    return best_vals[0], np.sqrt(covar[0,0]), t_bins, f_bins
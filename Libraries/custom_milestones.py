@@ -0,0 +1,78 @@
+from typing import Sequence
+import numpy as np
+
+
+# Finds the free energy minima (= maxima of the z counts histogram) to be used as milestones
+def find_milestones(counts : Sequence[int], bins : Sequence[float], delta_z : float, max_depth : float = 5.) -> tuple:
+    counts = np.asarray(counts)
+    bins = np.asarray(bins)
+    bin_lenght = bins[1]-bins[0]
+    centers = bins[1:] - bin_lenght/2
+
+    # Counts are smoothed over delta_z, so that noise on a scale smaller than the boxes does not produce spurious minima
+    width = max(1, int(round(delta_z/bin_lenght)))
+    counts = np.convolve(counts, np.ones(width)/width, mode = 'same')
+
+    # Local maxima of the histogram (>= on the left so that flat peaks are counted once)
+    left = np.concatenate(([-1], counts[:-1]))
+    right = np.concatenate((counts[1:], [-1]))
+    peaks = np.flatnonzero( (counts >= left) & (counts > right) & (counts > 0) )
+    peaks = peaks[ counts[peaks] * np.exp(max_depth) >= np.max(counts) ]    # Minima more than max_depth kT above the global one are ignored
+
+    # Highest peaks first. A peak is discarded if it is closer than 2*delta_z to an accepted one (boxes would overlap)
+    # or if the free energy barrier separating it from an accepted one is lower than kT (counts ratio smaller than e)
+    accepted = []
+    for index in peaks[np.argsort(counts[peaks], kind = 'stable')[::-1]]:
+        if all( abs(centers[index] - centers[j]) >= 2*delta_z and \
+                np.min(counts[min(index, j) : max(index, j)+1]) * np.e <= counts[index] for j in accepted ):
+            accepted.append(index)
+    return tuple(float(centers[index]) for index in sorted(accepted))
+
+
+# Computes transition times and residence times between every ordered pair of milestones with a single scan of the trajectory.
+# The rule is the same for every pair (i,j): frames spent in box i are summed up, the transition is counted when the ion enters box j
+# and stays there for at least acceptance_rate of the following n_frame_lag frames.
+# Boxes may overlap: for each pair, a frame in both boxes counts as time in box i (as z_start does in the two boxes analysis),
+# so the result of every pair is the same as the one of the two boxes analysis with z_start = milestones[i], z_end = milestones[j].
+def pairwise_transitions(coord : Sequence[float], milestones : Sequence[float], *, delta_z : float, n_frame_lag : int,
+        acceptance_rate : float) -> tuple:
+    coord = np.asarray(coord)
+    n_frames = len(coord)
+    n_milestones = len(milestones)
+    if n_frames == 0:
+        return [[[] for _ in range(n_milestones)] for _ in range(n_milestones)], np.zeros((n_milestones, n_milestones), dtype = np.int64)
+
+    # The state only changes when the ion enters or leaves a box: the trajectory is scanned as runs of frames in the same boxes
+    frames = np.arange(n_frames)
+    window_end = np.minimum(frames + max(n_frame_lag, 1), n_frames)
+    inside = np.empty((n_milestones, n_frames), dtype = bool)
+    accepted = np.empty((n_milestones, n_frames), dtype = bool)
+    change = np.zeros(n_frames, dtype = bool)
+    change[0] = True
+    for k in range(n_milestones):
+        inside[k] = (milestones[k]-delta_z < coord) & (coord < milestones[k]+delta_z)
+        change[1:] |= inside[k, 1:] != inside[k, :-1]
+        # True if the ion is in box k and stays there for at least acceptance_rate of the lag window starting from that frame
+        cum_inside = np.concatenate(([0], np.cumsum(inside[k])))
+        accepted[k] = inside[k] & ( (cum_inside[window_end] - cum_inside[frames]) / (window_end - frames) >= acceptance_rate )
+    starts = np.flatnonzero(change)
+    run_lengths = np.diff(np.append(starts, n_frames))
+    run_inside = inside[:, starts].T
+    run_accepted = np.logical_or.reduceat(accepted, starts, axis = 1).T
+
+    passage_time = np.zeros((n_milestones, n_milestones), dtype = np.int64)   # Frames spent in box i since the last i->j transition
+    res = np.zeros((n_milestones, n_milestones), dtype = np.int64)     # Total residence time
+    transition_times = [[[] for _ in range(n_milestones)] for _ in range(n_milestones)]
+    for length, in_boxes, ok in zip(run_lengths, run_inside, run_accepted):
+        if not in_boxes.any():
+            continue
+        for j in np.flatnonzero(ok):  # Valid entrance in box j: closes the pending transitions i->j, if the ion is not in box i too
+            for i in np.flatnonzero( (passage_time[:, j] > 0) & ~in_boxes ):
+                transition_times[i][j].append(int(passage_time[i, j]))
+                res[i, j] += passage_time[i, j]
+                passage_time[i, j] = 0
+        passage_time[in_boxes] += length
+        np.fill_diagonal(passage_time, 0)
+    res += passage_time     # Update res anyway when arrived at the last frame
+
+    return transition_times, res
@@ -1,18 +1,32 @@
 import sys
 from typing import NoReturn, Sequence
 from os.path import join
-from scipy.constants import k, Avogadro
 import numpy as np
 import matplotlib.pyplot as plt
+import Libraries.custom_pmf as custom_pmf
 
 
 boxes_color = 'orange'
 boxes_linewidth = 1.5
 dashes_imp = (8,6)
+error_band_alpha = .3
 plt.style.use('seaborn')
 
 
-# Plot tajectory of NaR
+# Plot free energy profile (with error band) shifted so that it is zero at the minimum in z_start_range
+def plot_pmf(coord : Sequence[float], n_bins : int, *, box_length : float, T : float, z_start_range : Sequence[float], **kwargs) -> NoReturn:
+    # kwargs are passed to plt.plot
+    bins, counts, energy, error = custom_pmf.free_energy_profile(coord, n_bins, box_length = box_length, T = T)
+    bin_lenght = bins[1]-bins[0]
+    start_min, start_max = z_start_range
+    index_z_start = np.argmin( energy[ int(start_min/bin_lenght) :  int(start_max/bin_lenght)] )  + int(start_min/bin_lenght) # finds where the min of energy is in z_start_range
+    centers = bins[1:] - bin_lenght/2
+    energy = energy - energy[index_z_start]
+    line, = plt.plot(centers, energy, linestyle = '-', **kwargs)
+    plt.fill_between(centers, energy - error, energy + error, color = line.get_color(), alpha = error_band_alpha, linewidth = 0)
+
+
+# Plot tajectory of NaR. coord must be already wrapped in [0, box_length) (MFPT.py wraps it in place once, after loading)
 def plot_trajectory(coord : Sequence[float], /, *, z_start : float, z_end : float, delta_z : float, filename : str, savefig_directory : str,
         add_savefig_name : str = '', savefigures : bool = True, **kwargs) -> NoReturn:  # coord must be positional
     plt.figure(figsize = (10,5))   
@@ -20,7 +34,7 @@ def plot_trajectory(coord : Sequence[float], /, *, z_start : float, z_end : floa
     plt.tick_params(labelsize=15)
     plt.ylabel('Time ($n^o$ frame)',fontsize=18)
     plt.xlabel('z ($\AA$)',fontsize=18)
-    plt.plot(coord % 90., range(len(coord)), linestyle=' ', markersize=2, marker = 'o') # %90. enforces BC for values >90 or < 0
+    plt.plot(coord, range(len(coord)), linestyle=' ', markersize=2, marker = 'o')
     plt.axvline(x=z_start + delta_z, color = boxes_color, dashes = dashes_imp, linewidth = boxes_linewidth)
     plt.axvline(x=z_start - delta_z, color = boxes_color, dashes = dashes_imp, linewidth = boxes_linewidth)
     plt.axvline(x=z_end + delta_z, color = boxes_color, dashes = dashes_imp, linewidth = boxes_linewidth)
@@ -33,10 +47,11 @@ def plot_trajectory(coord : Sequence[float], /, *, z_start : float, z_end : floa
 
 # Plot histogram of z bin counts
 def plot_hist_zcounts(coord : Sequence[float], /, *,z_start: float, z_end : float, delta_z : float, n_bins : int, filename : str,
-        savefig_directory : str, savefigures : bool = True, add_savefig_name : str = '', **kwargs) -> NoReturn:
+        savefig_directory : str, box_length : float, T : float, savefigures : bool = True, add_savefig_name : str = '', **kwargs) -> NoReturn:
     plt.figure(figsize = (10,5))
     plt.title('Z count histrogram, '+filename, fontsize=18)
-    plt.hist(coord % 90., bins = n_bins)    # %90. enforces BC for values >90 or < 0
+    bins, counts, _, _ = custom_pmf.free_energy_profile(coord, n_bins, box_length = box_length, T = T)   # Same profile (cached) as the free energy plots
+    plt.stairs(counts, bins, fill = True)
     plt.axvline(x=z_start + delta_z, color = boxes_color, dashes = dashes_imp, linewidth = boxes_linewidth)
     plt.axvline(x=z_start - delta_z, color = boxes_color, dashes = dashes_imp, linewidth = boxes_linewidth)
     plt.axvline(x=z_end + delta_z, color = boxes_color, dashes = dashes_imp, linewidth = boxes_linewidth)
@@ -51,23 +66,13 @@ def plot_hist_zcounts(coord : Sequence[float], /, *,z_start: float, z_end : floa
 
 # Plot free energy
 def plot_free_energy(coord : Sequence[float], /, *, z_start : float, z_end : float, delta_z : float, filename : str, n_bins : int, 
-        savefig_directory : str, add_savefig_name : str = '', savefigures : bool = True, **kwargs) -> NoReturn:
+        savefig_directory : str, box_length : float, T : float, z_start_range : Sequence[float],
+        add_savefig_name : str = '', savefigures : bool = True, **kwargs) -> NoReturn:
 
     plt.figure(figsize = (10,5))
     plt.title('Free energy profile, '+filename, fontsize=18)
 
-    def free_energy(count : int, tot_frame : int, bin_lenght : float, T : float = 300) -> float :   # Constants are in Standard SI units, free energy is returned in kJ/mol
-        F = -k*T*Avogadro*np.log( (count/tot_frame)/bin_lenght )
-        return F/1000       # /1000 -> kJ/mol
-
-    counts, bins = np.histogram(coord % 90., bins=n_bins) # %90. enforces BC for values >90 or < 0
-    tot_frame = len(coord)      # == sum(counts)
-    bin_lenght = bins[1]-bins[0]
-    energy = [free_energy(count, tot_frame, bin_lenght) for count in counts]
-
-    index_z_start = np.argmax( counts[ int(70/bin_lenght) :  int(80/bin_lenght)] )  + int(70/bin_lenght) # finds where the max of counts is for 70<z<80
-
-    plt.plot( bins[1:] - bin_lenght/2, energy - energy[index_z_start], linestyle = '-')
+    plot_pmf(coord, n_bins, box_length = box_length, T = T, z_start_range = z_start_range)
     plt.axvline(x=z_start + delta_z, color = boxes_color, dashes = dashes_imp, linewidth = boxes_linewidth)
     plt.axvline(x=z_start - delta_z, color = boxes_color, dashes = dashes_imp, linewidth = boxes_linewidth)
     plt.axvline(x=z_end + delta_z, color = boxes_color, dashes = dashes_imp, linewidth = boxes_linewidth)
@@ -99,30 +104,16 @@ def plt_hist_mfpt(*, t_bins : Sequence[float], f_bins : Sequence[float], transit
 
 
 def free_energy_comparison(coord : Sequence[float],coord2 : Sequence[float], /, *,z_start : float, z_end : float, delta_z : float, filename : str, n_bins : int, 
-       molarity1 : str,molarity2 : str, savefig_directory : str, add_savefig_name : str = '', savefigures : bool = True, **kwargs) -> NoReturn:
+       molarity1 : str,molarity2 : str, savefig_directory : str, box_length : float, T : float, z_start_range : Sequence[float],
+       add_savefig_name : str = '', savefigures : bool = True, **kwargs) -> NoReturn:
 
     plt.figure(figsize = (10,5))
     plt.title('Free energy profile, System '+filename[0], fontsize=18)
 
     colors = {'1': 'blue', '0025':'red'}
 
-    def free_energy(count : int, tot_frame : int, bin_lenght : float, T : float = 300) -> float :   # Constants are in Standard SI units, free energy is returned in kJ/mol
-        F = -k*T*Avogadro*np.log( (count/tot_frame)/bin_lenght )
-        return F/1000       # /1000 -> kJ/mol
-
-    counts, bins = np.histogram(coord % 90., bins=n_bins) # %90. enforces BC for values >90 or < 0
-    counts2, bins2 = np.histogram(coord2 % 90., bins=n_bins)
-    tot_frame = len(coord)      # == sum(counts)
-    bin_lenght = bins[1]-bins[0]
-    bin_lenght2 = bins2[1]-bins2[0]
-    energy = [free_energy(count, tot_frame, bin_lenght) for count in counts]
-    energy2 = [free_energy(count2, tot_frame, bin_lenght2) for count2 in counts2]
-
-    index_z_start = np.argmax( counts[ int(70/bin_lenght) :  int(80/bin_lenght)] )  + int(70/bin_lenght) # finds where the max of counts is for 70<z<80
-    index_z_start2 = np.argmax( counts2[ int(70/bin_lenght2) :  int(80/bin_lenght2)] )  + int(70/bin_lenght2) # finds where the max of counts is for 70<z<80
-
-    plt.plot( bins[1:] - bin_lenght/2, energy - energy[index_z_start], linestyle = '-', label = f'{molarity1}M', color = colors[molarity1])
-    plt.plot( bins2[1:] - bin_lenght2/2, energy2 - energy2[index_z_start2], linestyle = '-', label = f'{molarity2}M', color = colors[molarity2])
+    plot_pmf(coord, n_bins, label = f'{molarity1}M', color = colors[molarity1], box_length = box_length, T = T, z_start_range = z_start_range)
+    plot_pmf(coord2, n_bins, label = f'{molarity2}M', color = colors[molarity2], box_length = box_length, T = T, z_start_range = z_start_range)
     plt.axvline(x=z_start + delta_z, color = boxes_color, dashes = dashes_imp, linewidth = boxes_linewidth)
     plt.axvline(x=z_start - delta_z, color = boxes_color, dashes = dashes_imp, linewidth = boxes_linewidth)
     plt.axvline(x=z_end + delta_z, color = boxes_color, dashes = dashes_imp, linewidth = boxes_linewidth)
@@ -137,30 +128,16 @@ def free_energy_comparison(coord : Sequence[float],coord2 : Sequence[float], /,
     plt.close()
 
 def free_energy_comparison_with_umbrella(coord : Sequence[float],coord2 : Sequence[float], /, *,z_start : float, z_end : float, delta_z : float, filename : str, n_bins : int, 
-       molarity1 : str,molarity2 : str, savefig_directory : str, add_savefig_name : str = '', savefigures : bool = True, **kwargs) -> NoReturn:
+       molarity1 : str,molarity2 : str, savefig_directory : str, box_length : float, T : float, z_start_range : Sequence[float],
+       add_savefig_name : str = '', savefigures : bool = True, **kwargs) -> NoReturn:
 
     plt.figure(figsize = (10,5))
     plt.title('Free energy profile, System '+filename[0], fontsize=18)
 
     colors = {'1': 'blue', '0025':'red'}
 
-    def free_energy(count : int, tot_frame : int, bin_lenght : float, T : float = 300) -> float :   # Constants are in Standard SI units, free energy is returned in kJ/mol
-        F = -k*T*Avogadro*np.log( (count/tot_frame)/bin_lenght )
-        return F/1000       # /1000 -> kJ/mol
-
-    counts, bins = np.histogram(coord % 90., bins=n_bins) # %90. enforces BC for values >90 or < 0
-    counts2, bins2 = np.histogram(coord2 % 90., bins=n_bins)
-    tot_frame = len(coord)      # == sum(counts)
-    bin_lenght = bins[1]-bins[0]
-    bin_lenght2 = bins2[1]-bins2[0]
-    energy = [free_energy(count, tot_frame, bin_lenght) for count in counts]
-    energy2 = [free_energy(count2, tot_frame, bin_lenght2) for count2 in counts2]
-
-    index_z_start = np.argmax( counts[ int(70/bin_lenght) :  int(80/bin_lenght)] )  + int(70/bin_lenght) # finds where the max of counts is for 70<z<80
-    index_z_start2 = np.argmax( counts2[ int(70/bin_lenght2) :  int(80/bin_lenght2)] )  + int(70/bin_lenght2) # finds where the max of counts is for 70<z<80
-
-    plt.plot( bins[1:] - bin_lenght/2, energy - energy[index_z_start], linestyle = '-', label = f'{molarity1}M', color = colors[molarity1])
-    plt.plot( bins2[1:] - bin_lenght2/2, energy2 - energy2[index_z_start2], linestyle = '-', label = f'{molarity2}M', color = colors[molarity2])
+    plot_pmf(coord, n_bins, label = f'{molarity1}M', color = colors[molarity1], box_length = box_length, T = T, z_start_range = z_start_range)
+    plot_pmf(coord2, n_bins, label = f'{molarity2}M', color = colors[molarity2], box_length = box_length, T = T, z_start_range = z_start_range)
     plt.axvline(x=z_start + delta_z, color = boxes_color, dashes = dashes_imp, linewidth = boxes_linewidth)
     plt.axvline(x=z_start - delta_z, color = boxes_color, dashes = dashes_imp, linewidth = boxes_linewidth)
     plt.axvline(x=z_end + delta_z, color = boxes_color, dashes = dashes_imp, linewidth = boxes_linewidth)
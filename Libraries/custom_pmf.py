@@ -0,0 +1,71 @@
+import weakref
+from typing import Optional, Sequence
+import numpy as np
+
+
+# Profiles already computed, one for each (trajectory, n_bins, ...). An entry is removed when its trajectory is garbage collected.
+# The key is the identity of the array, not its content: an array changed in place after the first call gives the old profile.
+# Arrays must not be modified once analysed (MFPT.py makes them read-only).
+_cache = dict()
+chunk_size = 2**20  # Frames histogrammed at once: temporary arrays never exceed this length
+R = 8.314462618e-3  # Gas constant (k*Avogadro), kJ/(mol K)
+
+
+# Potential of mean force along z: F = -kT ln(p/bin_lenght), in kJ/mol. Returns bins, counts, free energy and its error.
+# If box_length is given, z is wrapped in [0, box_length) by folding the bin index. The trajectory is read in chunks of chunk_size frames
+# with two reused buffers, so it is never copied.
+# The error is the standard error over n_blocks contiguous blocks of the trajectory, computed in the same pass as the counts.
+def free_energy_profile(coord : Sequence[float], n_bins : int, *, box_length : Optional[float] = None, T : float = 300.,
+        n_blocks : int = 5) -> tuple:
+    cached = isinstance(coord, np.ndarray)  # Other sequences (e.g. lists) cannot be weakly referenced
+    key = (id(coord), n_bins, box_length, T, n_blocks)
+    if cached and key in _cache:
+        return _cache[key]
+
+    coord = np.asarray(coord)
+    n_frames = len(coord)
+    if box_length is None:
+        z_min, z_max = np.min(coord), np.max(coord)
+        bin_lenght = (z_max - z_min)/n_bins
+    else:
+        z_min = 0.
+        bin_lenght = box_length/n_bins
+    bins = z_min + bin_lenght*np.arange(n_bins + 1)
+
+    # Counts of each block as rows; the frames left over by the last whole block are in the extra row
+    n_blocks = max(n_blocks, 1)
+    block_lenght = max(n_frames // n_blocks, 1)
+    block_counts = np.zeros((n_blocks+1, n_bins), dtype = np.int64)
+    z_buffer = np.empty(min(chunk_size, n_frames))
+    index_buffer = np.empty(len(z_buffer), dtype = np.intp)
+    for block in range(n_blocks+1):
+        block_start = min(block*block_lenght, n_frames)
+        block_end = n_frames if block == n_blocks else min(block_start + block_lenght, n_frames)
+        for start in range(block_start, block_end, chunk_size):
+            chunk = coord[start : min(start + chunk_size, block_end)]
+            z, index = z_buffer[:len(chunk)], index_buffer[:len(chunk)]
+            np.subtract(chunk, z_min, out = z)
+            np.floor_divide(z, bin_lenght, out = z)
+            np.copyto(index, z, casting = 'unsafe')
+            if box_length is None:
+                np.minimum(index, n_bins - 1, out = index)    # z_max belongs to the last bin, as in np.histogram
+            else:
+                np.remainder(index, n_bins, out = index)  # Periodic boundary conditions
+            block_counts[block] += np.bincount(index, minlength = n_bins)
+    counts = block_counts.sum(axis = 0)
+
+    kT = R*T  # kJ/mol
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        p = counts/n_frames
+        energy = -kT*np.log(p/bin_lenght)
+        if n_blocks > 1 and n_frames >= n_blocks:
+            block_p = block_counts[:n_blocks]/block_lenght
+            error = kT * np.std(block_p, axis = 0, ddof = 1)/np.sqrt(n_blocks) / p   # dF = kT dp/p
+        else:
+            error = np.zeros(n_bins)
+
+    result = (bins, counts, energy, error)
+    if cached:
+        weakref.finalize(coord, _cache.pop, key, None)
+        _cache[key] = result
+    return result
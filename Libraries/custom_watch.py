@@ -0,0 +1,70 @@
+import os
+from threading import Lock
+from time import sleep
+from typing import Iterable, NoReturn, Optional
+try:    # Optional: without inotify_simple the directory is polled
+    from inotify_simple import INotify, flags
+except ImportError:
+    INotify = None
+
+
+class Directory_Watcher():  # Detects new or changed files in a directory. Uses inotify if available, polling otherwise.
+    def __init__(self, directory : str, extensions : Iterable[str], poll_interval : float = 2.) -> NoReturn:
+        self.directory = directory
+        self.extensions = tuple(extensions)
+        self.poll_interval = poll_interval
+        self.__seen = self.__signatures()   # Files already present are not reported
+        self.__pending = dict()
+        self.__lock = Lock()    # scan() and mark_seen() may be called from different threads
+        self.__inotify = None
+        if INotify is not None:
+            self.__inotify = INotify()
+            self.__inotify.add_watch(directory, flags.CLOSE_WRITE | flags.MOVED_TO)
+
+    def __get_backend(self):
+        return 'polling' if self.__inotify is None else 'inotify'
+    backend = property(__get_backend)
+
+    def __signatures(self) -> dict:   # (mtime, size) of every file with a watched extension
+        signatures = dict()
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(self.extensions):
+                    stat = entry.stat()
+                    signatures[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        return signatures
+
+    def mark_seen(self, filename : str) -> NoReturn:    # Used for files written by the program itself (e.g. converted NPY)
+        stat = os.stat(os.path.join(self.directory, filename))
+        with self.__lock:
+            self.__seen[filename] = (stat.st_mtime_ns, stat.st_size)
+            self.__pending.pop(filename, None)
+
+    def wait(self, timeout : Optional[float] = None) -> NoReturn:     # Blocks until something happens in the directory or timeout
+        timeout = self.poll_interval if timeout is None else timeout
+        if self.__inotify is None:
+            sleep(timeout)
+        else:
+            self.__inotify.read(timeout = int(timeout*1000))
+
+    def scan(self) -> list:
+        # A file is reported only when its signature did not change since the previous scan, so that files still being written are skipped
+        changed = []
+        signatures = self.__signatures()
+        with self.__lock:
+            for name in set(self.__seen) - set(signatures):     # Deleted files are forgotten
+                del self.__seen[name]
+            for name, signature in signatures.items():
+                if self.__seen.get(name) == signature:
+                    continue
+                if self.__pending.get(name) == signature:
+                    changed.append(name)
+                    self.__seen[name] = signature
+                    del self.__pending[name]
+                else:
+                    self.__pending[name] = signature
+        return sorted(changed)
+
+    def close(self) -> NoReturn:
+        if self.__inotify is not None:
+            self.__inotify.close()
@@ -1,7 +1,8 @@
 import os, re, sys
+from queue import Queue, Empty, Full
+from threading import Thread, Lock, Event
 from typing import NoReturn
 import numpy as np
-from scipy.optimize import curve_fit
 from argparse import ArgumentParser
 from configparser import ConfigParser
 from timeit import default_timer as timer
@@ -22,15 +23,32 @@ if not os.path.exists(os.path.join('Libraries','custom_errors.py')):
 if not os.path.exists(os.path.join('Libraries','custom_class.py')):
     print("Error: Can't find 'custom_class.py' in the directory 'Libraries'.")
     sys.exit(1)
+if not os.path.exists(os.path.join('Libraries','custom_milestones.py')):
+    print("Error: Can't find 'custom_milestones.py' in the directory 'Libraries'.")
+    sys.exit(1)
+if not os.path.exists(os.path.join('Libraries','custom_pmf.py')):
+    print("Error: Can't find 'custom_pmf.py' in the directory 'Libraries'.")
+    sys.exit(1)
+if not os.path.exists(os.path.join('Libraries','custom_fit.py')):
+    print("Error: Can't find 'custom_fit.py' in the directory 'Libraries'.")
+    sys.exit(1)
+if not os.path.exists(os.path.join('Libraries','custom_watch.py')):
+    print("Error: Can't find 'custom_watch.py' in the directory 'Libraries'.")
+    sys.exit(1)
 
 import Libraries.custom_plot as custom_plt    # Library with custom plotting functions (one for each graph)
 from Libraries.custom_errors import *          # Library with custom exceptions
 import Libraries.custom_class as custom_class    # Library with custom data class
+import Libraries.custom_milestones as custom_ms     # Library with milestones detection and transitions between boxes
+import Libraries.custom_watch as custom_watch    # Library with the watcher of npy_directory
+import Libraries.custom_pmf as custom_pmf      # Library with the free energy profile (shared with the plots)
+import Libraries.custom_fit as custom_fit      # Library with the estimators of tau
 
 
 program_description = '''
 NaR Mean First Passage Time Data analysis. Takes input parameters and files from the parsed INI file and produces an output file with the result of the analysis.\
-Optional: production of graphs for Free Energy, Trajectory, Histogram of z counts and MFPT distribution.'''
+Optional: production of graphs for Free Energy, Trajectory, Histogram of z counts and MFPT distribution.\
+With --watch, new or changed TXT/NPY files in npy_directory are converted and analysed as they arrive.'''
 
 
 def NPY_data_analysis(NPY : str) -> NoReturn:
@@ -52,14 +70,17 @@ def NPY_data_analysis(NPY : str) -> NoReturn:
 
     # Load trajectory array from .npy file
     z_coordinate_NAR = np.load(os.path.join(params.npy_directory, NPY))     # z_coordinate_NAR is np.ndarray
+    np.mod(z_coordinate_NAR, params.box_length, out = z_coordinate_NAR)     # Wrapped once, in place: enforces BC for values >box_length or < 0
+    z_coordinate_NAR.flags.writeable = False    # Read-only from now on: free energy profiles are cached per array
 
 
-    # Find z_start, z_min from z counts histogram    
-    hist, bins = np.histogram(z_coordinate_NAR, bins = params.n_bins)
+    # Find z_start, z_min from the free energy profile (cached: the plots use the same one)
+    bins, hist, energy, _ = custom_pmf.free_energy_profile(z_coordinate_NAR, params.n_bins, box_length = params.box_length, T = params.temperature)
     dz = bins[1]-bins[0] # Angstrom
-    index_z_start = np.argmax( hist[ int(70/dz) :  int(80/dz)] )  + int(70/dz) # finds where the max of counts is for 70<z<80
+    (start_min, start_max), (end_min, end_max) = params.z_start_range, params.z_end_range
+    index_z_start = np.argmin( energy[ int(start_min/dz) :  int(start_max/dz)] )  + int(start_min/dz) # finds where the min of free energy is in z_start_range
     z_start = index_z_start * dz 
-    z_end = ( np.argmax( hist[ int(40/dz) : int(70/dz) ] ) + int(40/dz) )* dz  # finds where the max of counts is for 40<z<70
+    z_end = ( np.argmin( energy[ int(end_min/dz) : int(end_max/dz) ] ) + int(end_min/dz) )* dz  # finds where the min of free energy is in z_end_range
     
     #Plot trajectory, z counts histogram and free energy
     if params.plot_graphs:
@@ -78,32 +99,38 @@ def NPY_data_analysis(NPY : str) -> NoReturn:
                     # If the name of a file is wrong a warning will be printed later when it is analysed by the function NPY_data_analysis
                     continue
                 if pattern.fullmatch(f).group(1) == system_name and pattern.fullmatch(f).group(2) != molarity: # Same system but different molarity
-                    custom_plt.free_energy_comparison(z_coordinate_NAR, np.load(os.path.join(params.npy_directory, f)), \
+                    z_coordinate_NAR2 = np.load(os.path.join(params.npy_directory, f))     # Loaded once: its free energy profile is cached
+                    np.mod(z_coordinate_NAR2, params.box_length, out = z_coordinate_NAR2)
+                    z_coordinate_NAR2.flags.writeable = False
+                    custom_plt.free_energy_comparison(z_coordinate_NAR, z_coordinate_NAR2, \
                         molarity1 = molarity, molarity2 = pattern.fullmatch(f).group(2), **plotting_params)
                     if pattern.fullmatch(f).group(1) in ['B','C']:
-                        custom_plt.free_energy_comparison_with_umbrella(z_coordinate_NAR, np.load(os.path.join(params.npy_directory, f)), \
+                        custom_plt.free_energy_comparison_with_umbrella(z_coordinate_NAR, z_coordinate_NAR2, \
                             molarity1 = molarity, molarity2 = pattern.fullmatch(f).group(2), **plotting_params)
                     sys_analysed.append(system_name)
                     break
             else:   # If the other file has not been found
                 print("Warning: The counterpart of '{NPY}' with different molarity has not been found in '{params.npy_directory}'")
 
-    #Compute total residence time and transition times from z_start to z_end
-    transition_times  = list()
     n_frame_lag = int(params.lag_time/delta_t)  # Number of frames analysed to choose if the transition valid
-    passage_time = 0      # Residence time between transitions
-    res = 0       # Total residence time
-    for i in range(len(z_coordinate_NAR)):
-        if z_start-params.delta_z < z_coordinate_NAR[i] < z_start+params.delta_z:     # Update residence time if in strarting box
-            passage_time += 1
-        elif (z_end-params.delta_z < z_coordinate_NAR[i] < z_end+params.delta_z) and (passage_time != 0):   # If the ion is in second box and has returned at least once in the first box
-            mask = [ z_end-params.delta_z < z < z_end+params.delta_z for z in z_coordinate_NAR[i: i+n_frame_lag] ]   # List of bool: True if the ion stayed in the box
-            if sum(mask)/len(mask) >= params.acceptance_rate:     # Executed if particle stayed in the box for at least the number of frames required by the acceptance rate
-                res += passage_time
-                transition_times.append(passage_time)                                   
-                passage_time = 0
-        if i == len(z_coordinate_NAR) - 1:     # Update res anyway when arrived at the last frame
-            res += passage_time
+
+    # Transitions z_start -> z_end and, if milestones are given, between every ordered pair of milestones: a single scan of the trajectory
+    milestones = ()
+    if params.milestones is not None:
+        milestones = custom_ms.find_milestones(hist, bins, params.delta_z) if params.milestones == 'auto' else params.milestones
+        if len(milestones) < 2:     # Only possible with 'auto': explicit lists are checked in the input file
+            print(f"Warning: less than two free energy minima found in '{NPY}', no MFPT matrix between milestones for this file.")
+            milestones = ()
+    all_transition_times, all_res = custom_ms.pairwise_transitions(z_coordinate_NAR, (z_start, z_end) + tuple(milestones), \
+        delta_z = params.delta_z, n_frame_lag = n_frame_lag, acceptance_rate = params.acceptance_rate)
+
+    # MFPT matrix between every ordered pair of milestones, printed at the end of the output file
+    if len(milestones) >= 2:
+        ms_transition_times = [row[2:] for row in all_transition_times[2:]]
+        milestones_results.append((system_name, molarity, milestones, ms_transition_times, all_res[2:, 2:]*delta_t))
+
+    #Total residence time and transition times from z_start to z_end
+    transition_times, res = all_transition_times[0][1], all_res[0,1]
 
     n_transitions = len(transition_times)
     if n_transitions == 0:      #  No transition found
@@ -116,21 +143,20 @@ def NPY_data_analysis(NPY : str) -> NoReturn:
         
         raise NoTransitionFoundError(NPY)
 
+    censored_time = (res - sum(transition_times)) * delta_t    # Time in the starting box of the last, unfinished, passage
     transition_times = [n_frames * delta_t for n_frames in transition_times]    # conversion n of frame -> time
     res*=delta_t
 
-    # Fit of tau
-    def fitfunction(t, tau, A):    # tau is in ps only if t is
-        return A * np.exp(-t / tau)
-
-    t_bins = np.linspace(0.1, np.amax(transition_times), params.nbins_t)
-    hist, _ = np.histogram(transition_times, bins=t_bins)
-    t_bin_len = t_bins[1]-t_bins[0]
-    best_vals, covar = curve_fit(fitfunction, t_bins[:-1] + t_bin_len, hist, p0=[500.0, hist[0]] )
-    f_bins = fitfunction(t_bins, *best_vals)    # y values of fit curve
-
-    tau = best_vals[0]
-    d_tau = np.sqrt(covar[0,0])     # Std. Dev.
+    # Estimate of tau
+    if params.fit_method == 'histogram':
+        tau, d_tau, t_bins, f_bins = custom_fit.histogram_fit(transition_times, params.nbins_t)
+    else:
+        if params.fit_method == 'censored_mle':
+            tau, d_tau = custom_fit.censored_exponential_mle(transition_times, censored_time)
+        else:
+            tau, d_tau = custom_fit.exponential_mle(transition_times)
+        t_bins = np.linspace(0, np.amax(transition_times), params.nbins_t)     # Only used for the histogram of mfpt distribution
+        f_bins = custom_fit.exponential_curve(t_bins, tau, n_transitions)
 
     # Plot histogram of mfpt distribution
     if params.plot_graphs:
@@ -148,6 +174,115 @@ def NPY_data_analysis(NPY : str) -> NoReturn:
 
 
 
+def print_milestones_results() -> NoReturn:
+    # MFPT matrices: row i, column j refers to the transition from milestone i to milestone j
+    # tau is from the batched maximum likelihood: with fit_method = histogram the plain mle is used, and the header says so
+    matrix_fit_method = 'censored_mle' if params.fit_method == 'censored_mle' else 'mle'
+    out_file.write(f'\n\tMFPT MATRICES BETWEEN MILESTONES (MFPT as ratio and tau, time is in ps) \t Tau from: {matrix_fit_method}' + \
+        (' (histogram fit not available for the matrices)' if params.fit_method == 'histogram' else '') + '\n')
+    for system_name, molarity, milestones, ms_transition_times, ms_res in milestones_results:
+        n_ms = len(milestones)
+        # tau of every couple of milestones with a single batched fit
+        times_sets = [np.multiply(ms_transition_times[i][j], delta_t) for i in range(n_ms) for j in range(n_ms)]
+        censored_times = None
+        if matrix_fit_method == 'censored_mle':
+            censored_times = [ms_res[i,j] - np.sum(times_sets[i*n_ms + j]) for i in range(n_ms) for j in range(n_ms)]
+        tau, d_tau = custom_fit.exponential_mle_batch(times_sets, censored_times)
+        tau, d_tau = tau.reshape(n_ms, n_ms), d_tau.reshape(n_ms, n_ms)
+
+        out_file.write(f'SYSTEM {system_name} \t MOLARITY {molarity} \t MILESTONES (A): ' + ', '.join(f'{z:.1f}' for z in milestones) + '\n')
+        for title, cell in (('MFPT (N)', lambda i, j: '{:.0f} ({:d})'.format(ms_res[i,j]/len(ms_transition_times[i][j]), len(ms_transition_times[i][j]))), \
+                ('TAU +- STD', lambda i, j: '{:.0f} +- {:.0f}'.format(tau[i,j], d_tau[i,j]))):
+            out_file.write('{:<10}'.format(title) + ''.join('{:>20.1f}'.format(z) for z in milestones) + '\n')
+            for i, z in enumerate(milestones):
+                row = ['-' if i == j else 'NO TRANSITIONS' if len(ms_transition_times[i][j]) == 0 else cell(i, j) for j in range(n_ms)]
+                out_file.write('{:<10.1f}'.format(z) + ''.join('{:>20}'.format(x) for x in row) + '\n')
+    out_file.write('Rows: starting milestone, columns: final milestone. N: number of transition events\n')
+    milestones_results.clear()
+
+
+# Converts a TXT trajectory to NPY (as npy_generator.py does) and returns the name of the NPY file
+def TXT_to_NPY(TXT : str) -> str:
+    NPY = TXT.removesuffix('.txt') + '.npy'
+    np.save(os.path.join(params.npy_directory, NPY), np.loadtxt(os.path.join(params.npy_directory, TXT)))
+    return NPY
+
+
+# Scans npy_directory in a background thread and queues new or changed files. Analysis (and pyplot) stays in the main thread.
+def scan_directory(watcher : custom_watch.Directory_Watcher, jobs : Queue, queued : set, queued_lock : Lock, stop : Event) -> NoReturn:
+    try:
+        while not stop.is_set():
+            for filename in watcher.scan():
+                with queued_lock:
+                    # Skipped if already queued, or if it is the NPY of a queued TXT (it will be analysed after the conversion)
+                    if filename in queued or filename.removesuffix('.npy') + '.txt' in queued:
+                        continue
+                    queued.add(filename)
+                while not stop.is_set():    # Bounded queue: waits if the analysis is falling behind, but never past a stop
+                    try:
+                        jobs.put(filename, timeout = watcher.poll_interval)
+                        break
+                    except Full:
+                        continue
+            watcher.wait()
+    except Exception as err:     # e.g. npy_directory removed: reported, the main thread stops watching
+        print(f"Error: '{params.npy_directory}' cannot be watched anymore ({type(err).__name__}: {err}).")
+
+
+# Converts (if needed) and analyses a file found by the watcher. Any error is reported and the next file is analysed.
+def watched_file_analysis(filename : str, watcher : custom_watch.Directory_Watcher, queued : set, queued_lock : Lock) -> NoReturn:
+    global NPYs
+    with queued_lock:
+        queued.discard(filename)
+    try:
+        if filename.endswith('.txt'):
+            filename = TXT_to_NPY(filename)
+            watcher.mark_seen(filename)     # The NPY just written must not be queued again
+        NPYs = tuple([ file_ for file_ in os.listdir(params.npy_directory) if file_.endswith('.npy') ])
+        if filename[0] in sys_analysed:     # Free energy comparison is plotted again with the new data
+            sys_analysed.remove(filename[0])
+        NPY_data_analysis(filename)
+    except (FileNotValidError, NoTransitionFoundError) as err:
+        print('Warning: ', err, ', proceeding to next file.', sep='')
+    except Exception as err:    # e.g. file removed, not a valid trajectory, fit not converging: the watcher must keep running
+        print(f"Warning: '{filename}' could not be analysed ({type(err).__name__}: {err}), proceeding to next file.")
+        custom_plt.plt.close('all')     # Figures left open by the failed analysis
+    finally:
+        out_file.flush()    # Matrices between milestones are printed at shutdown, so that the rows of the table stay together
+
+
+# The interpreter, the libraries and the parameters stay loaded between files
+def watch_directory(watcher : custom_watch.Directory_Watcher) -> NoReturn:
+    jobs = Queue(maxsize = args_parser.queue_size)   # Bounded: the scanner waits if the analysis is falling behind
+    queued, queued_lock, stop = set(), Lock(), Event()     # Names of the files in jobs
+
+    # TXT files not yet converted (or changed after the conversion) are analysed at start
+    startup_files = []
+    for TXT in sorted(file_ for file_ in os.listdir(params.npy_directory) if file_.endswith('.txt')):
+        NPY_path = os.path.join(params.npy_directory, TXT.removesuffix('.txt') + '.npy')
+        if not os.path.exists(NPY_path) or os.path.getmtime(NPY_path) < os.path.getmtime(os.path.join(params.npy_directory, TXT)):
+            startup_files.append(TXT)
+    queued.update(startup_files)
+
+    scanner = Thread(target = scan_directory, args = (watcher, jobs, queued, queued_lock, stop), daemon = True)
+    scanner.start()
+    print(f"Watching '{params.npy_directory}' for new TXT/NPY files ({watcher.backend}). Press Ctrl+C to stop.")
+    try:
+        for filename in startup_files:
+            watched_file_analysis(filename, watcher, queued, queued_lock)
+        while scanner.is_alive():
+            try:
+                filename = jobs.get(timeout = watcher.poll_interval)
+            except Empty:
+                continue
+            watched_file_analysis(filename, watcher, queued, queued_lock)
+    except KeyboardInterrupt:
+        print('Watch mode stopped.')
+    stop.set()
+    scanner.join()
+    watcher.close()
+
+
 ### START ###
 
 timer_start = timer()   # Start the timer
@@ -162,6 +297,9 @@ if not (sys.version_info.major == 3 and sys.version_info.minor >= 9):
 PROGNAME = os.path.basename(sys.argv[0])
 parser = ArgumentParser(prog = PROGNAME, description = program_description)
 parser.add_argument('-i','--input','--input_file', dest= 'input', help='input INI file. default: input_file.ini', default = 'input_file.ini')
+parser.add_argument('-w','--watch', action = 'store_true', help='after the analysis, keep watching npy_directory and analyse new or changed files')
+parser.add_argument('--poll_interval', type = float, default = 2., help='seconds between two scans of npy_directory in watch mode. default: 2')
+parser.add_argument('--queue_size', type = int, default = 16, help='max number of files waiting to be analysed in watch mode. default: 16')
 args_parser = parser.parse_args()
 input_file = args_parser.input
 
@@ -181,13 +319,14 @@ try:
 except (OptionError, ParameterNotPresentError, SectionNotPresentError) as err:
     print(err)
     sys.exit(1)
-delta_t = 0.04
+delta_t = params.delta_t
 
 # Creation of savefig_directory if it is needed and does not exist.
 if params.plot_graphs:
     plotting_params = {
         'plot_graphs': params.plot_graphs, 'delta_z': params.delta_z, 'savefigures': params.save_figures, \
-        'n_bins': params.n_bins, 'add_savefig_name': params.add_savefig_name, 'savefig_directory': params.savefig_directory}
+        'n_bins': params.n_bins, 'add_savefig_name': params.add_savefig_name, 'savefig_directory': params.savefig_directory, \
+        'box_length': params.box_length, 'T': params.temperature, 'z_start_range': params.z_start_range}
     if (not os.path.exists(params.savefig_directory)) and params.save_figures:
         os.mkdir(params.savefig_directory)
 
@@ -198,9 +337,11 @@ if not os.path.exists(params.npy_directory):
 if not os.path.isdir(params.npy_directory):
     print(f"Error: '{params.npy_directory}' is not a directory.")
     sys.exit(1)
+# In watch mode, the snapshot of the files already present is taken before listing them: files written during the first analysis are caught
+watcher = custom_watch.Directory_Watcher(params.npy_directory, ('.txt', '.npy'), poll_interval = args_parser.poll_interval) if args_parser.watch else None
 NPYs = tuple([ file_ for file_ in os.listdir(params.npy_directory) if file_.endswith('.npy') ])
 #print(NPYs)
-if len(NPYs) == 0:
+if len(NPYs) == 0 and not args_parser.watch:
     print(f'Error: No valid file has been found in the directory {params.npy_directory}')
     sys.exit(1)
 
@@ -209,13 +350,15 @@ print('The following files will be analysed: \n', ', '.join(NPYs))
 
 # List of already analysed systems
 sys_analysed = []
+# Results of the milestones analysis, printed after the results of all the files
+milestones_results = []
 
 # Creation of output file with the results of the data analysis
 with open(params.output_file, 'w') as out_file:
     out_file.write('\tRESULTS NAR DATA ANALYSIS\n')
-    out_file.write(f'\t PARAMETERS USED: \t delta_z = {params.delta_z} A \t Lag time = {params.lag_time} ps \t Accaptance rate = {params.acceptance_rate} \t Time is in ps\n')
+    out_file.write(f'\t PARAMETERS USED: \t delta_z = {params.delta_z} A \t Lag time = {params.lag_time} ps \t Accaptance rate = {params.acceptance_rate} \t delta_t = {params.delta_t} ps \t Box length = {params.box_length} A \t T = {params.temperature} K \t Tau from: {params.fit_method} \t Time is in ps\n')
     out_file.write('{:<15} {:<10} {:>15} {:>20} {:>20} {:>20} {:>15} {:>15} {:>10} {:>10}\n'.format( \
-        'SYSTEM', 'MOLARITY','TRANSITION EV.','RESIDENCE TIME','MFPT as ratio','MFPT as mean','TAU FITTED', 'TAU DEV. STD.', 'MAX', 'MIN'))
+        'SYSTEM', 'MOLARITY','TRANSITION EV.','RESIDENCE TIME','MFPT as ratio','MFPT as mean','TAU', 'TAU DEV. STD.', 'MAX', 'MIN'))
     
     # Print execution progress
     print('{:<25} {:<20}'.format('N. of analysed files:','Time elapsed (s):'))
@@ -230,6 +373,16 @@ with open(params.output_file, 'w') as out_file:
             continue
         #break          # Useful for testing on just one file
 
+    out_file.flush()
+
+    # Watch mode: files arriving in npy_directory are analysed and their results appended to the table
+    if args_parser.watch:
+        watch_directory(watcher)
+
+    # Matrices between milestones of all the analysed files (also those analysed in watch mode), after the table
+    if params.milestones is not None:
+        print_milestones_results()
+
     print(f"Results correctly printed in '{params.output_file}'")
     if params.plot_graphs and params.save_figures:
         print(f"Graphs correctly saved in the directory '{params.savefig_directory}'")
\ No newline at end of file